@@ -140,6 +140,7 @@ class App(Gtk.Application):
             raise RuntimeError("unknown stack child")
 
     def disable_view(self):
+        self._view.save_progress()
         self._view.timer.enabled = False
         self._view.cursor.set_cursor(CursorIcon.DEFAULT)
 
@@ -35,6 +35,8 @@ class CoverCache:
         self._base.mkdir(exist_ok=True, parents=True)
         self._max_size = max_size
         self._max_shape = max_shape
+        # thumbnail() takes plain ints, convert once instead of per call
+        self._thumb_size: Tuple[int, int] = tuple(map(int, max_shape))
         self._in_mem = InMemCache(max_in_mem)
 
         self._idle_source: Optional[GLib.Source] = None
@@ -68,9 +70,7 @@ class CoverCache:
                 cache_msg("file hit", p)
                 return imdecode(in_mem)
         else:
-            page = Archive(library / comics).read(idx)
-            thumb = imdecode(page)
-            thumb.thumbnail(self._max_shape)
+            thumb = self._thumbnail(library, comics, idx)
             p.parent.mkdir(exist_ok=True, parents=True)
             with p.open("wb") as f:
                 # TODO just use PIL save
@@ -82,6 +82,12 @@ class CoverCache:
             self.cleanup()
             return thumb
 
+    def _thumbnail(self, library: Path, comics: Path, idx: int) -> Image:
+        thumb = imdecode(Archive(library / comics).read(idx),
+                         self._thumb_size)
+        thumb.thumbnail(self._thumb_size)
+        return thumb
+
     def start_idle(self, library: Path, data: List[Tuple[Path, int]]):
         cache_msg("start idle")
         if self._idle_source is not None:
@@ -120,9 +126,7 @@ class CoverCache:
         elif isinstance(v, ToCache):
             k, p = self.key(v.library, v.comics, v.page_idx)
             if not p.exists():
-                page = Archive(v.library / v.comics).read(v.page_idx)
-                thumb = imdecode(page)
-                thumb.thumbnail(self._max_shape)
+                thumb = self._thumbnail(v.library, v.comics, v.page_idx)
                 p.parent.mkdir(exist_ok=True, parents=True)
                 with p.open("wb") as f:
                     # TODO just use PIL save
@@ -5,7 +5,6 @@ import cairo
 import numpy as np
 from contextlib import contextmanager
 from collections import defaultdict
-from shapely.geometry import MultiPoint
 
 from .gi_helpers import Gdk, Gtk, Rsvg, GdkPixbuf
 from .utils import RESOURCE_BASE_DIR
@@ -78,7 +77,8 @@ class Cursor:
                 vp.y, vp.x = 0, 0
                 vp.height, vp.width = rect[1], rect[0]
                 handle.render_document(cr, vp)
-            img = img[..., [2, 1, 0, 3]].copy()  # BGRA2RGBA
+            # BGRA2RGBA, the fancy index already returns a packed copy
+            img = img[..., [2, 1, 0, 3]]
             pixbuf = GdkPixbuf.Pixbuf.new_from_data(
                 data=img.tobytes(),
                 colorspace=GdkPixbuf.Colorspace.RGB,
@@ -90,5 +90,5 @@ class Cursor:
             return Gdk.Cursor.new_from_pixbuf(
                 self.gdk_display,
                 pixbuf,
-                *MultiPoint([np.zeros(2), rect]).bounds[2:]
+                *np.maximum(rect, 0.0)
             )
@@ -1,22 +1,23 @@
-from typing import Hashable, Optional, Dict
+from typing import Hashable, Optional, Dict, Any, Callable
 from operator import itemgetter
 from time import time
 
 
 class InMemCache:
-    def __init__(self, max_size: int):
+    def __init__(self, max_size: int, sizeof: Callable[[Any], int] = len):
         self._max_size = max_size
-        self._cache: Dict[Hashable, bytes] = {}
+        self._sizeof = sizeof
+        self._cache: Dict[Hashable, Any] = {}
         self._lru: Dict[Hashable, int] = {}
 
-    def get(self, key: Hashable) -> Optional[bytes]:
+    def get(self, key: Hashable) -> Optional[Any]:
         if key in self._cache:
             self._lru[key] = time()
             return self._cache[key]
         return None
 
     def size(self):
-        return sum(map(len, self._cache.values()))
+        return sum(map(self._sizeof, self._cache.values()))
 
     @property
     def max_size(self):
@@ -27,7 +28,7 @@ class InMemCache:
         self._max_size = max_size
         self._drop()
 
-    def store(self, key: Hashable, value: bytes):
+    def store(self, key: Hashable, value: Any):
         self._cache[key] = value
         self._lru[key] = time()
         self._drop()
@@ -38,9 +39,9 @@ class InMemCache:
                        key=itemgetter(0))
         while size > self.max_size:
             k = usage.pop(0)[1]
-            size -= len(self._cache[k])
+            size -= self._sizeof(self._cache[k])
             del self._lru[k]
             del self._cache[k]
 
     def fits(self, size: int) -> bool:
-        return self.size + size <= self.max_size
+        return self.size() + size <= self.max_size
@@ -376,7 +376,8 @@ class Library:
                 ).order_by(Comics.title, Comics.issue, Comics.path)
 
         if comics is not None:
-            refresh_gio_model(self.list_store, list(map(ComicsIcon, comics)))
+            refresh_gio_model(self.list_store, list(map(ComicsIcon, comics)),
+                              key=ComicsIcon.to_tuple)
 
     def _refresh_view_model(self):
         new = [(x, f"{COLLECTION_PREFIX}{x}") for x in chain.from_iterable(
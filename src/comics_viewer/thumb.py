@@ -68,7 +68,7 @@ class Thumb:
         pages = len(self.archive) if self.archive else 0
         refresh_gio_model(self._store, [
             PageInfo(path=self.archive.path, page_idx=i) for i in range(pages)
-        ])
+        ], key=PageInfo.to_tuple)
 
     def create_thumb(self, obj: PageInfo):
         builder = Gtk.Builder()
@@ -1,15 +1,18 @@
-from typing import List, Optional, NewType, Union, Tuple, Callable, Dict
+from typing import List, Optional, NewType, Union, Tuple, Callable
 import numpy as np
 import numpy.typing as npt
 import cairo
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from contextlib import contextmanager
 from enum import IntEnum
-from shapely.geometry import MultiPoint, box, Polygon, Point, MultiPolygon
+from shapely.geometry import box, Polygon, Point, MultiPolygon
 from shapely.strtree import STRtree
 from shapely.ops import nearest_points
+from shapely import (
+    get_coordinates, get_num_coordinates, point_on_surface, prepare,
+)
 
-from .gi_helpers import Gtk
+from .gi_helpers import Gtk, GLib
 from .cursor import CursorIcon
 
 
@@ -22,12 +25,10 @@ RECTANGLE_CURSOR_SIZE = 20  # the first in widget coorditanes
 def html(s: str):
     assert(len(s) in [1 + 6, 1 + 8])
     assert(s[0] == "#")
-    s = s[1:]
-    r = int(s[:2], base=16)
-    g = int(s[2:4], base=16)
-    b = int(s[4:6], base=16)
-    a = int(s[6:8], base=16) if len(s) == 8 else 255
-    return np.array([r, g, b, a]) / 255
+    v = int(s[1:], base=16)
+    if len(s) == 1 + 6:
+        v = v << 8 | 0xff
+    return np.array([v >> 24, v >> 16 & 0xff, v >> 8 & 0xff, v & 0xff]) / 255
 
 
 @contextmanager
@@ -52,22 +53,36 @@ STATE_TO_ICON = {
 }
 
 
-def isclose(a: Point, b: Point):
-    return np.isclose(a.x, b.x, atol=3) and np.isclose(a.y, b.y, atol=3)
+def isclose(a: Point, b: Point, atol: float = 3):
+    return abs(a.x - b.x) <= atol and abs(a.y - b.y) <= atol
+
+
+def nearest_on_border(p: Point, w: float, h: float) -> Tuple[float, float]:
+    x, y = min(max(p.x, 0.0), w), min(max(p.y, 0.0), h)
+    if 0 < x < w and 0 < y < h:
+        # inside the rectangle, move to the closest edge
+        edges = [(0.0, y), (w, y), (x, 0.0), (x, h)]
+        return edges[np.argmin([x, w - x, y, h - y])]
+    return x, y
+
+
+def bounding_box(a: Point, b: Point) -> Polygon:
+    return box(min(a.x, b.x), min(a.y, b.y), max(a.x, b.x), max(a.y, b.y))
+
+
+TILE_COLORS = np.array([html(c) for c in [
+    "#46f0f0", "#f032e6", "#bcf60c", "#fabebe", "#008080", "#e6beff",
+    "#9a6324", "#fffac8", "#800000", "#aaffc3", "#808000", "#ffd8b1",
+    "#e6194b", "#3cb44b", "#ffe119", "#4363d8", "#f58231", "#911eb4",
+    "#000075", "#808080", "#ffffff", "#000000",
+]])
 
 
 @dataclass
 class Colors:
     erase = html("#ff0000")
     pending = html("#00ff00")
-    tile: List[npt.NDArray] = field(default_factory=lambda: [
-        html(c) for c in [
-            "#46f0f0", "#f032e6", "#bcf60c", "#fabebe", "#008080", "#e6beff",
-            "#9a6324", "#fffac8", "#800000", "#aaffc3", "#808000", "#ffd8b1",
-            "#e6194b", "#3cb44b", "#ffe119", "#4363d8", "#f58231", "#911eb4",
-            "#000075", "#808080", "#ffffff", "#000000",
-        ]
-    ])
+    tile = TILE_COLORS
 
 
 class WidgetPosCache:
@@ -75,9 +90,13 @@ class WidgetPosCache:
                  tiles, rect_begin, points):
         self._t = transform
 
-        self._tiles_orig: List[Polygon] = tiles
+        self._tiles_orig: List[Polygon] = list(tiles)
         self._tiles: Optional[List[List[WidgetPos]]] = None
-        self._representative_points: Optional[List[WidgetPos]] = None
+        self._tile_paths: Optional[List[cairo.Path]] = None
+        self._representative_points: Optional[npt.NDArray] = None
+        # paths are recorded on a scratch context and replayed when drawing
+        self._path_cr = cairo.Context(cairo.ImageSurface(cairo.Format.A8,
+                                                         1, 1))
 
         self._rect_begin_orig: ImagePos = rect_begin
         self._rect_begin: Optional[WidgetPos] = None
@@ -87,6 +106,7 @@ class WidgetPosCache:
 
     def invalidate(self):
         self._tiles = None
+        self._tile_paths = None
         self._representative_points = None
         self._rect_begin = None
         self._points = None
@@ -94,20 +114,63 @@ class WidgetPosCache:
     @property
     def tiles(self) -> List[List[WidgetPos]]:
         if self._tiles is None:
-            self._tiles = [[self._t(p) for p in t.exterior.coords]
-                           for t in self._tiles_orig]
+            # all vertices are transformed in a single batch
+            exteriors = [t.exterior for t in self._tiles_orig]
+            self._tiles = np.split(
+                self._t(get_coordinates(exteriors)),
+                np.cumsum(get_num_coordinates(exteriors))[:-1]
+            ) if exteriors else []
         return self._tiles
 
     @tiles.setter
     def tiles(self, tiles: List[Polygon]):
-        self._tiles_orig = tiles
+        self._tiles_orig = list(tiles)
         self._tiles = None
+        self._tile_paths = None
         self._representative_points = None
 
+    def _contour_path(self, contour: List[WidgetPos]) -> cairo.Path:
+        cr = self._path_cr
+        cr.new_path()
+        cr.move_to(*contour[0])
+        for p in contour[1:]:
+            cr.line_to(*p)
+        cr.close_path()
+        return cr.copy_path()
+
+    @property
+    def tile_paths(self) -> List[cairo.Path]:
+        if self._tile_paths is None:
+            self._tile_paths = list(map(self._contour_path, self.tiles))
+        return self._tile_paths
+
+    def append_tile(self, tile: Polygon):
+        self._tiles_orig.append(tile)
+        if self._tiles is not None:
+            self._tiles.append(self._t(get_coordinates(tile.exterior)))
+        if self._tile_paths is not None:
+            self._tile_paths.append(self._contour_path(self._tiles[-1]))
+        if self._representative_points is not None:
+            self._representative_points = np.vstack([
+                self._representative_points,
+                self._t(get_coordinates(point_on_surface(tile))),
+            ])
+
+    def remove_tiles(self, indices: List[int]):
+        keep = [idx for idx in range(len(self._tiles_orig))
+                if idx not in indices]
+        self._tiles_orig = [self._tiles_orig[idx] for idx in keep]
+        if self._tiles is not None:
+            self._tiles = [self._tiles[idx] for idx in keep]
+        if self._tile_paths is not None:
+            self._tile_paths = [self._tile_paths[idx] for idx in keep]
+        if self._representative_points is not None:
+            self._representative_points = self._representative_points[keep]
+
     def representative_point(self, idx):
         if self._representative_points is None:
-            self._representative_points = [
-                self._t(t.representative_point()) for t in self._tiles_orig]
+            self._representative_points = self._t(get_coordinates(
+                point_on_surface(self._tiles_orig)))
         return self._representative_points[idx]
 
     @property
@@ -124,7 +187,7 @@ class WidgetPosCache:
     @property
     def points(self) -> List[WidgetPos]:
         if self._points is None:
-            self._points = [self._t(p) for p in self._points_orig]
+            self._points = list(self._t(get_coordinates(self._points_orig)))
         return self._points
 
     @points.setter
@@ -148,6 +211,8 @@ class Tiles:
         self._cursor: Optional[ImagePos] = None
         self._pen_down = False
         self._snap = True
+        self._motion_idle: Optional[int] = None
+        self._motion_pos: Optional[WidgetPos] = None
 
         # state and related variables
         self._state = State.RECTANGLE
@@ -156,7 +221,9 @@ class Tiles:
         self._points: List[Polygon] = []
         self._tree: STRtree = STRtree([])
         self._line_tree: STRtree = STRtree([])
-        self._tree_indices: Dict[int, int] = {}
+        self._tile_areas: npt.NDArray = np.empty(0)
+        self._erase_cache: Optional[
+            Tuple[Tuple[ImagePos, ImagePos], List[int]]] = None
         self._cache = WidgetPosCache(self.transform,
                                      self._tiles,
                                      self._rect_begin,
@@ -183,12 +250,13 @@ class Tiles:
         return Point(self._view.widget_to_img(pos))
 
     def i2w(self, pos: ImagePos) -> WidgetPos:
-        return self._view.img_to_widget(np.array(pos.coords).reshape(2))
+        return self._view.img_to_widget(np.array((pos.x, pos.y)))
 
     # translate from image to widget
-    def transform(self, p: Union[Tuple[float, float], ImagePos]) -> WidgetPos:
-        if isinstance(p, tuple):
-            p = Point(*p)
+    def transform(self, p: Union[Tuple[float, float], ImagePos, npt.NDArray]
+                  ) -> WidgetPos:
+        if isinstance(p, (tuple, np.ndarray)):
+            return self._view.img_to_widget(np.asarray(p, dtype=np.float64))
         return self.i2w(p)
 
     def _draw(self, area: Gtk.DrawingArea, cr: cairo.Context):
@@ -199,36 +267,37 @@ class Tiles:
             self._draw_tiles(cr)
         cr.new_sub_path()
         with save(cr):
-            self._draw_state(cr, self.transform)
+            self._draw_state(cr)
 
     def _draw_tiles(self, cr: cairo.Context):
         erase_indices = self.to_be_erased()
-        # display tiles
-        for idx, tile in enumerate(self._tiles):
-            if idx in erase_indices:
-                cr.set_source_rgba(*self._colors.erase)
-                cr.set_line_width(4)
-            else:
-                cr.set_source_rgba(
-                    *self._colors.tile[idx % len(self._colors.tile)])
-                cr.set_line_width(2)
-            # contour
-            cr.move_to(*self._cache.tiles[idx][0])
-            for p in self._cache.tiles[idx][1:]:
-                cr.line_to(*p)
-            cr.line_to(*self._cache.tiles[idx][0])
+        palette = self._colors.tile
+        buckets = np.arange(len(self._tiles)) % len(palette)
+        colors = palette[buckets]
+        colors[erase_indices] = self._colors.erase
+        buckets[erase_indices] = -1
+        # contours, a single stroke per color
+        for bucket in np.unique(buckets):
+            indices = np.flatnonzero(buckets == bucket)
+            cr.set_source_rgba(*colors[indices[0]])
+            cr.set_line_width(4 if bucket < 0 else 2)
+            for idx in indices:
+                cr.append_path(self._cache.tile_paths[idx])
             cr.stroke()
-            # label
+        # labels
+        for idx, color in enumerate(colors):
+            cr.set_source_rgba(*color)
             cr.move_to(*self._cache.representative_point(idx))
             with save(cr):
                 cr.rotate(-self._view.angle)
                 cr.show_text(f"{idx + 1}")
 
-    def _draw_state(self, cr: cairo.Context, t: Callable):
+    def _draw_state(self, cr: cairo.Context):
         c_orig = self._cursor
         c_snapped = self.snap(self._cursor) if self._cursor else None
-        c_widget = t(c_snapped if self._state != State.ERASE else c_orig
-                     ) if self._cursor else None
+        c_widget = self.transform(
+            c_snapped if self._state != State.ERASE else c_orig
+        ) if self._cursor else None
 
         # set styling current operation
         if self._state == State.ERASE:
@@ -266,39 +335,33 @@ class Tiles:
             c_orig and self._points and
             isclose(c_snapped, self._points[0])
         )
-        begin: Optional[WidgetPos] = None
-        # pending points
-        if self._points:
-            begin = self._cache.points[0]
-            end = self._cache._points[-1]
-            cr.arc(*begin, 8, 0, np.pi * 2)
-            if cursor_on_begin:
-                cr.fill()
-            else:
-                cr.stroke()
-            cr.move_to(*begin)
-        for point in self._cache.points[1:]:
-            cr.line_to(*point)
+        points = self._cache.points
+        # connecting lines in a single path
+        if points:
+            cr.move_to(*points[0])
+            for point in points[1:]:
+                cr.line_to(*point)
+            if c_orig and cursor_on_begin and len(points) > 1:
+                cr.line_to(*points[0])
+            elif c_orig and not cursor_on_begin:
+                cr.line_to(*c_widget)
             cr.stroke()
+        # filled markers of the pending points
+        for point in points[0 if cursor_on_begin else 1:]:
+            cr.new_sub_path()
             cr.arc(*point, 8, 0, np.pi * 2)
-            cr.fill()
-            cr.move_to(*point)
+        cr.fill()
+        if points and not cursor_on_begin:
+            cr.new_sub_path()
+            cr.arc(*points[0], 8, 0, np.pi * 2)
+            cr.stroke()
         # cursor
-        if c_orig:
-            if cursor_on_begin and len(self._points) > 1:
-                cr.move_to(*end)
-                cr.line_to(*begin)
-                cr.stroke()
-            if not cursor_on_begin:
-                cr.new_sub_path()
-                if self._points:
-                    cr.move_to(*end)
-                    cr.line_to(*c_widget)
-                    cr.stroke()
-                if self._snap:
-                    cr.set_dash([5, 2])
-                cr.arc(*c_widget, 8, 0, np.pi * 2)
-                cr.stroke()
+        if c_orig and not cursor_on_begin:
+            if self._snap:
+                cr.set_dash([5, 2])
+            cr.new_sub_path()
+            cr.arc(*c_widget, 8, 0, np.pi * 2)
+            cr.stroke()
 
     def to_be_erased(self) -> List[int]:
         if (
@@ -307,51 +370,52 @@ class Tiles:
             self._rect_begin is None
         ):
             return []
-        selection = box(*MultiPoint([self._rect_begin, self._cursor]).bounds)
-        inside = []
-        outside = None
-        for tile in self._tree.query(selection):
-            if selection.contains(tile):
-                inside.append(self._tree_indices[id(tile)])
-                continue
-            if (
-                not inside and
-                tile.contains(selection) and
-                (outside is None or self._tiles[outside].area > tile.area)
-            ):
-                outside = self._tree_indices[id(tile)]
-        if inside:
-            return inside
-        if outside is not None:
-            return [outside]
+        # the same endpoints are drawn multiple times, e.g. on expose
+        key = (self._rect_begin, self._cursor)
+        if (
+            self._erase_cache is not None and
+            self._erase_cache[0][0] is key[0] and
+            self._erase_cache[0][1] is key[1]
+        ):
+            return self._erase_cache[1]
+        rv = self._to_be_erased()
+        self._erase_cache = (key, rv)
+        return rv
+
+    def _to_be_erased(self) -> List[int]:
+        selection = bounding_box(self._rect_begin, self._cursor)
+        # tiles inside the selection
+        inside = self._tree.query(selection, predicate="contains")
+        if len(inside):
+            return sorted(map(int, inside))
+        # otherwise the smallest tile enclosing the selection, the tiles
+        # are prepared so contains is evaluated on their cached index
+        enclosing = [int(idx) for idx in self._tree.query(selection)
+                     if self._tiles[idx].contains(selection)]
+        if enclosing:
+            return [min(enclosing, key=self._tile_areas.__getitem__)]
         return []
 
     def snap(self, pos: ImagePos):
         if not self._snap:
             return pos
-        cands = []
-        distances = []
-
-        def append_point(p: Point):
-            cands.append(p)
-            distances.append(p.distance(pos))
+        cands: List[Tuple[float, float]] = []
         if self._rect_begin:
-            append_point(self._rect_begin)
+            cands.append((self._rect_begin.x, self._rect_begin.y))
         if self._points:
-            append_point(self._points[0])
+            cands.append((self._points[0].x, self._points[0].y))
         if self._view.img_shape is not None:
-            img = box(*MultiPoint([Point(0, 0), self._view.img_shape]).bounds
-                      ).exterior
-            append_point(nearest_points(img, pos)[0])
+            cands.append(nearest_on_border(pos, *self._view.img_shape))
         if self._tiles:
-            tile = self._line_tree.nearest(pos)
+            tile = self._tiles[self._line_tree.nearest(pos)].exterior
             tile_point = nearest_points(tile, pos)[0]
-            append_point(tile_point)
+            cands.append((tile_point.x, tile_point.y))
         if cands:
-            min_idx = np.argmin(distances)
-            distance = distances[min_idx]
-            if distance < EPSILON / self._view.scale:
-                return cands[min_idx]
+            cands = np.array(cands)
+            distances = np.hypot(*(cands - (pos.x, pos.y)).T)
+            min_idx = distances.argmin()
+            if distances[min_idx] < EPSILON / self._view.scale:
+                return Point(cands[min_idx])
         return pos
 
     def queue_draw(self):
@@ -367,7 +431,8 @@ class Tiles:
         self._tiles = []
         self._tree = STRtree([])
         self._line_tree = STRtree([])
-        self._tree_indices = {}
+        self._tile_areas = np.empty(0)
+        self._erase_cache = None
         self._dirty = False
         self._motion_timeout = None
         self._tile_timeout = None
@@ -379,16 +444,24 @@ class Tiles:
         self._area.queue_draw()
 
     def clip(self, pos: ImagePos) -> ImagePos:
-        return Point(np.clip(*(np.array(a, dtype=np.float64).reshape(2)
-                               for a in (pos.coords,
-                                         (0, 0), self._view.img_shape))))
+        w, h = self._view.img_shape
+        return Point(min(max(pos.x, 0.0), w), min(max(pos.y, 0.0), h))
 
-    def _tiles_changed(self):
+    def _tiles_changed(self, added: Optional[Polygon] = None,
+                       removed: Optional[List[int]] = None):
         self._dirty = True
-        self._tree_indices = {id(p): idx for idx, p in enumerate(self._tiles)}
+        self._tile_areas = np.array([tile.area for tile in self._tiles])
+        prepare(self._tiles)
+        self._erase_cache = None
         self._tree = STRtree(self._tiles)
         self._line_tree = STRtree([tile.exterior for tile in self._tiles])
-        self._cache.tiles = self._tiles
+        # keep the widget positions of the untouched tiles
+        if added is not None:
+            self._cache.append_tile(added)
+        elif removed is not None:
+            self._cache.remove_tiles(removed)
+        else:
+            self._cache.tiles = self._tiles
 
     def _change_state(self, state: State):
         if state == State.ERASE:
@@ -423,8 +496,9 @@ class Tiles:
             pos = self.snap(self.clip(self.w2i(pos)))
             if self._points and isclose(pos, self._points[0]):
                 if len(self._points) > 2:
-                    self._tiles.append(Polygon(self._points))
-                    self._tiles_changed()
+                    tile = Polygon(get_coordinates(self._points))
+                    self._tiles.append(tile)
+                    self._tiles_changed(added=tile)
                     self._points = []
                     self._cache.points = self._points
             else:
@@ -439,9 +513,9 @@ class Tiles:
             if self._rect_begin is None:
                 return
             if not isclose(self._rect_begin, pos):
-                self._tiles.append(box(*MultiPoint([self._rect_begin,
-                                                    pos]).bounds))
-                self._tiles_changed()
+                tile = bounding_box(self._rect_begin, pos)
+                self._tiles.append(tile)
+                self._tiles_changed(added=tile)
         self._cursor = None
         self._rect_begin = None
         self._cache.rect_begin = None
@@ -460,13 +534,29 @@ class Tiles:
         self._tiles = [t for idx, t in enumerate(self._tiles)
                        if idx not in erase_indices]
         if erase_indices:
-            self._tiles_changed()
+            self._tiles_changed(removed=erase_indices)
         self._change_state(self._restore)
         self.queue_draw()
 
     def pen_motion(self, pos: WidgetPos):
+        last = self._motion_pos
+        if (
+            self._cursor is not None and last is not None and
+            abs(pos[0] - last[0]) < 1 and abs(pos[1] - last[1]) < 1
+        ):
+            # below a device pixel, nothing would change on screen
+            return
+        self._motion_pos = pos
         self._cursor = self.w2i(pos)
+        # coalesce motion events arriving faster than the redraws
+        if self._motion_idle is None:
+            self._motion_idle = GLib.idle_add(self._motion_redraw,
+                                              priority=GLib.PRIORITY_HIGH_IDLE)
+
+    def _motion_redraw(self):
+        self._motion_idle = None
         self.queue_draw()
+        return GLib.SOURCE_REMOVE
 
     def pen_left(self):
         self._rect_begin = None
@@ -475,4 +565,5 @@ class Tiles:
         self.queue_draw()
 
     def transformation_changed(self):
+        self._motion_pos = None
         self._cache.invalidate()
@@ -1,8 +1,8 @@
-from typing import List, Any, NewType
+from typing import List, Any, NewType, Callable, Hashable, Tuple, Optional
 from pathlib import Path
+import os
 from collections import namedtuple
 import numpy as np
-from difflib import SequenceMatcher
 from enum import IntEnum
 from PIL import Image as image
 from PIL.Image import Image
@@ -14,20 +14,33 @@ from .gi_helpers import Gio, Gtk, GdkPixbuf
 RESOURCE_BASE_DIR = Path(__file__).parent
 Coord = namedtuple("Coord", ["x", "y"])
 ImgSize = NewType("ImgSize", Coord)
+# decoders of archive.IMAGE_TYPES, the rest of the plugins are never probed
+IMAGE_FORMATS = ["JPEG", "PNG", "GIF"]
+ENCODE_PARAMS = {
+    "JPEG": {"quality": 85},
+    # zlib effort dominates the encode, the gain above level 1 is small
+    "PNG": {"compress_level": 1},
+}
 
 
 def image_shape(img: Image) -> ImgSize:
     return Coord(*img.size)
 
 
-def imdecode(buf: bytes) -> Image:
-    with image.open(BytesIO(buf), formats=None) as im:
-        return im.convert("RGB")
+def imdecode(buf: bytes, size: Optional[Tuple[int, int]] = None) -> Image:
+    im = image.open(BytesIO(buf), formats=IMAGE_FORMATS)
+    # given a size, libjpeg scales down by 1/2..1/8 inside the DCT, draft
+    # leaves the mode and the other formats alone
+    if size is not None:
+        im.draft("RGB", size)
+    im.load()
+    # convert copies even when the mode already matches
+    return im if im.mode == "RGB" else im.convert("RGB")
 
 
-def imencode(img: Image) -> bytes:
+def imencode(img: Image, format: str = "JPEG", **params) -> bytes:
     rv = BytesIO()
-    img.save(rv, format="PNG")
+    img.save(rv, format=format, **{**ENCODE_PARAMS.get(format, {}), **params})
     return rv.getvalue()
 
 
@@ -38,21 +51,87 @@ class Opcode(IntEnum):
     equal = 3
 
 
+def myers_opcodes(a, b) -> List[Tuple[str, int, int, int, int]]:
+    """SequenceMatcher.get_opcodes compatible output of a Myers diff"""
+    n, m = len(a), len(b)
+    v = {1: 0}
+    trace = []
+    # forward pass, furthest reaching path on each diagonal k = x - y
+    for d in range(n + m + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x, y = x + 1, y + 1
+            v[k] = x
+            if x >= n and y >= m:
+                break
+        else:
+            continue
+        break
+    # backtrack into single element moves, last one first
+    moves = []
+    x, y = n, m
+    for d in reversed(range(len(trace))):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            moves.append(Opcode.equal)
+            x, y = x - 1, y - 1
+        if d > 0:
+            moves.append(Opcode.insert if x == prev_x else Opcode.delete)
+        x, y = prev_x, prev_y
+    # group the moves into equal and changed runs
+    runs = []
+    i = j = 0
+    for move in reversed(moves):
+        equal = move == Opcode.equal
+        if not runs or runs[-1][0] != equal:
+            runs.append([equal, i, i, j, j])
+        if move != Opcode.insert:
+            i += 1
+        if move != Opcode.delete:
+            j += 1
+        runs[-1][2], runs[-1][4] = i, j
+    rv = []
+    for equal, i1, i2, j1, j2 in runs:
+        if equal:
+            tag = Opcode.equal
+        elif i1 == i2:
+            tag = Opcode.insert
+        elif j1 == j2:
+            tag = Opcode.delete
+        else:
+            tag = Opcode.replace
+        rv.append((tag.name, i1, i2, j1, j2))
+    return rv
+
+
 def diff_opcodes(a, b):
+    # trivial inputs do not need the matcher
+    if a == b:
+        if a:
+            yield Opcode.equal, 0, len(a), 0, len(b)
+        return
+    if not a or not b:
+        yield (Opcode.insert if b else Opcode.delete), 0, len(a), 0, len(b)
+        return
     offset_i = 0
-    for tag, i1, i2, j1, j2 in SequenceMatcher(a=a, b=b).get_opcodes():
-        i1 += offset_i
-        i2 += offset_i
-        if tag == Opcode.replace.name:
-            yield Opcode.replace, i1, i2, j1, j2
-        elif tag == Opcode.delete.name:
-            yield Opcode.delete, i1, i2, j1, j2
-            offset_i -= i2 - i1
-        elif tag == Opcode.insert.name:
-            yield Opcode.insert, i1, i2, j1, j2
-            offset_i += j2 - j1
-        elif tag == Opcode.equal.name:
-            yield Opcode.equal, i1, i2, j1, j2
+    for tag, i1, i2, j1, j2 in myers_opcodes(a, b):
+        code = Opcode[tag]
+        yield code, i1 + offset_i, i2 + offset_i, j1, j2
+        # the consumer applies each opcode before receiving the next one
+        offset_i += (j2 - j1) - (i2 - i1)
 
 
 def wrap_add_action(add_action):
@@ -65,49 +144,75 @@ def wrap_add_action(add_action):
 
 
 def refresh_gtk_model(model: Gtk.ListStore, target: List[Any],
-                      offset: int = 0):
-    ms = list(model)[offset:]
-    for code, i1, i2, j1, j2 in diff_opcodes(ms, target):
+                      offset: int = 0,
+                      key: Callable[[Any], Hashable] = tuple):
+    # rows are compared by key, TreeModelRow never equals a plain tuple
+    ms = []
+    it = model.iter_nth_child(None, offset)
+    while it is not None:
+        ms.append(key(model[it]))
+        it = model.iter_next(it)
+    keys = list(map(key, target))
+    if ms == keys:
+        return
+    for code, i1, i2, j1, j2 in diff_opcodes(ms, keys):
         i1 += offset
         i2 += offset
-        if code == Opcode.insert:
-            for i, j in zip(range(i1, i1 + j2 - j1), range(j1, j2)):
-                model.insert(i, target[j])
-        elif code == Opcode.delete:
-            for i in range(i1, i2):
-                it = model.iter_nth_child(None, i1)
-                if it is not None:
-                    model.remove(it)
-        elif code == Opcode.replace:
-            for i, j in zip(range(i1, i2 + 1), range(j1, j2 + 1)):
-                if i < len(model) and j < len(target):
-                    model.set_row(model.iter_nth_child(None, i), target[j])
-                elif i >= len(model) and j < len(target):
-                    model.insert(i, target[j])
-                elif j >= len(target) and i < len(model):
-                    model.remove(model.iter_nth_child(None, i))
-
-
-def refresh_gio_model(model: Gio.ListModel, target: List[Any]):
-    ms = list(model)
-    for code, i1, i2, j1, j2 in diff_opcodes(ms, target):
-        if code == Opcode.insert or code == Opcode.replace:
-            model[i1:i2] = target[j1:j2]
-        elif code == Opcode.delete:
-            del model[i1:i2]
+        if code == Opcode.equal:
+            continue
+        # position once, then walk the rows with the same iter
+        it = model.iter_nth_child(None, i1)
+        common = min(i2 - i1, j2 - j1) if code == Opcode.replace else 0
+        for j in range(j1, j1 + common):
+            model.set_row(it, target[j])
+            it = model.iter_next(it)
+        for _ in range(i2 - i1 - common):
+            # remove moves the iter to the next row
+            model.remove(it)
+        for i, j in enumerate(range(j1 + common, j2), i1 + common):
+            model.insert(i, target[j])
+
+
+def refresh_gio_model(model: Gio.ListStore, target: List[Any],
+                      key: Callable[[Any], Hashable] = lambda x: x):
+    ms = [key(model.get_item(i)) for i in range(model.get_n_items())]
+    keys = list(map(key, target))
+    if keys[:len(ms)] == ms:
+        # append only, covers the unchanged model as well
+        if len(keys) > len(ms):
+            model.splice(len(ms), 0, target[len(ms):])
+        return
+    if not ms or not keys or (ms[0] != keys[0] and ms[-1] != keys[-1]):
+        # nothing in common at either end, e.g. a different comics
+        model.splice(0, len(ms), target)
+        return
+    # one splice, thus one items-changed emission, per differing run
+    for code, i1, i2, j1, j2 in diff_opcodes(ms, keys):
+        if code != Opcode.equal:
+            model.splice(i1, i2 - i1, target[j1:j2])
 
 
 def dfs_gen(path: Path, base=None):
     if base is None:
         base = path
-    for child in path.iterdir():
-        assert(not child.is_symlink())
-        if child.is_dir():
-            for grand in dfs_gen(child, base):
-                yield grand
-            yield child.relative_to(base)
+    # entries are kept as strings, relative paths are cut off by length
+    prefix = len(os.path.join(base, ""))
+    # post-order walk, a directory is yielded after its content
+    stack = [(None, os.scandir(path))]
+    while stack:
+        directory, it = stack[-1]
+        entry = next(it, None)
+        if entry is None:
+            it.close()
+            stack.pop()
+            if directory is not None:
+                yield Path(directory.path[prefix:])
+            continue
+        assert(not entry.is_symlink())
+        if entry.is_dir(follow_symlinks=False):
+            stack.append((entry, os.scandir(entry.path)))
         else:
-            yield child.relative_to(base)
+            yield Path(entry.path[prefix:])
 
 
 def image_to_pixbuf(img: Image) -> GdkPixbuf.Pixbuf:
@@ -123,10 +228,10 @@ def image_to_pixbuf(img: Image) -> GdkPixbuf.Pixbuf:
 
 
 def is_in(widget: Gtk.Widget, x: int, y: int):
-    pos = np.array([x, y])
-    rect = widget.get_allocation()
-    shape = np.array([rect.width, rect.height])
-    if np.all(np.zeros(2) < pos) and np.all(pos <= shape):
-        return pos.astype(np.float64)
+    if (
+        0 < x <= widget.get_allocated_width() and
+        0 < y <= widget.get_allocated_height()
+    ):
+        return np.array([x, y], dtype=np.float64)
     else:
         return None
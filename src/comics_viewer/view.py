@@ -1,6 +1,9 @@
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Dict, Hashable
 import os
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, Future
 from collections import namedtuple
+from operator import attrgetter
 from pathlib import Path
 from contextlib import ExitStack, contextmanager
 import OpenGL.GL as OGL
@@ -9,17 +12,15 @@ from OpenGL.GL import shaders
 from ctypes import c_void_p
 import numpy as np
 import numpy.typing as npt
-from transforms3d.affines import compose as affine_compose
 from transforms3d.axangles import axangle2mat
 from datetime import datetime
 import humanize
 from shapely.geometry import MultiPolygon
 import shapely.wkt as wkt
 import json
-from PIL.Image import Image
 
 from .library import Comics, Progress, Library
-from .gi_helpers import Gtk, Gdk
+from .gi_helpers import Gtk, Gdk, GLib
 from .in_mem_cache import InMemCache
 from .archive import Archive
 from .cover_cache import CoverCache
@@ -46,14 +47,29 @@ VERTEX_DATA = np.array([
     -1.0, -1.0, 0.0,   0.0, 0.0,      # bottom left
     -1.0,  1.0, 0.0,   0.0, 1.0       # top left
 ], dtype="f")
+# bytes per vertex, 3 position and 2 texture coordinates
+VERTEX_STRIDE = 5 * VERTEX_DATA.itemsize
 INDICES_DATA = np.array([
     0, 1, 3,
     1, 2, 3,
 ], dtype=np.uint32)
+# the sources never change at runtime, realize only compiles them
+FRAGMENT_CODE = (RESOURCE_BASE_DIR / "view.fs").read_text()
+VERTEX_CODE = (RESOURCE_BASE_DIR / "view.vs").read_text()
+# glValidateProgram is a debugging aid, link errors are reported regardless
+VALIDATE_SHADERS = bool(int(os.environ.get(
+    "COMICS_VIEWER_VALIDATE_SHADERS", 0)))
+PROGRESS_SAVE_DELAY_MS = 500
 
 
-def cat(x, *v):
-    return np.concatenate([x, v])
+def _invert_affine(affine: npt.NDArray) -> npt.NDArray:
+    # the rows of the linear block are orthogonal, a rotation scaled by the
+    # zoom, so the inverse is its transpose over the squared row norms
+    rv = np.eye(4)
+    linear = affine[:3, :3]
+    rv[:3, :3] = linear.T / np.einsum("ij,ij->i", linear, linear)
+    rv[3, :3] = -np.dot(affine[3, :3], rv[:3, :3])
+    return rv
 
 
 @contextmanager
@@ -67,9 +83,8 @@ def _vertex_arrays(size: int):
 
 
 @contextmanager
-def _vbo(vertex_data: npt.NDArray):
-    rv = vbo.VBO(vertex_data, usage=OGL.GL_STATIC_DRAW,
-                 target=OGL.GL_ARRAY_BUFFER)
+def _vbo(vertex_data: npt.NDArray, target=OGL.GL_ARRAY_BUFFER):
+    rv = vbo.VBO(vertex_data, usage=OGL.GL_STATIC_DRAW, target=target)
     try:
         yield rv
     finally:
@@ -83,7 +98,8 @@ def _compile_and_link_shaders(fragment_code, vertex_code):
         stack.callback(OGL.glDeleteShader, fragment)
         vertex = shaders.compileShader(vertex_code, OGL.GL_VERTEX_SHADER)
         stack.callback(OGL.glDeleteShader, vertex)
-        rv = shaders.compileProgram(vertex, fragment, validate=True)
+        rv = shaders.compileProgram(vertex, fragment,
+                                    validate=VALIDATE_SHADERS)
         stack.pop_all()
     try:
         yield rv
@@ -92,27 +108,48 @@ def _compile_and_link_shaders(fragment_code, vertex_code):
 
 
 @contextmanager
-def _load_texture(img: Image):
+def _texture():
     texture = OGL.glGenTextures(1)
     OGL.glBindTexture(OGL.GL_TEXTURE_2D, texture)
-    OGL.glTexParameteri(
-        OGL.GL_TEXTURE_2D, OGL.GL_TEXTURE_WRAP_S, OGL.GL_REPEAT)
-    OGL.glTexParameteri(
-        OGL.GL_TEXTURE_2D, OGL.GL_TEXTURE_WRAP_T, OGL.GL_REPEAT)
-    OGL.glTexParameteri(OGL.GL_TEXTURE_2D, OGL.GL_TEXTURE_MIN_FILTER,
-                        OGL.GL_LINEAR_MIPMAP_LINEAR)
-    OGL.glTexParameteri(
-        OGL.GL_TEXTURE_2D, OGL.GL_TEXTURE_MAG_FILTER, OGL.GL_LINEAR)
-    h, w, image = img.height, img.width, img.tobytes()
-    OGL.glTexImage2D(OGL.GL_TEXTURE_2D, 0, OGL.GL_RGBA, w, h, 0, OGL.GL_RGB,
-                     OGL.GL_UNSIGNED_BYTE, image)
-    OGL.glGenerateMipmap(OGL.GL_TEXTURE_2D)
     try:
         yield texture
     finally:
         OGL.glDeleteTextures(1, texture)
 
 
+# filtering lives in a sampler bound to unit 0 once per context, so texture
+# storage can be reallocated without repeating the parameter setup
+@contextmanager
+def _sampler():
+    sampler = OGL.glGenSamplers(1)
+    OGL.glSamplerParameteri(sampler, OGL.GL_TEXTURE_WRAP_S, OGL.GL_REPEAT)
+    OGL.glSamplerParameteri(sampler, OGL.GL_TEXTURE_WRAP_T, OGL.GL_REPEAT)
+    OGL.glSamplerParameteri(sampler, OGL.GL_TEXTURE_MIN_FILTER,
+                            OGL.GL_LINEAR_MIPMAP_LINEAR)
+    OGL.glSamplerParameteri(
+        sampler, OGL.GL_TEXTURE_MAG_FILTER, OGL.GL_LINEAR)
+    OGL.glBindSampler(0, sampler)
+    try:
+        yield sampler
+    finally:
+        OGL.glBindSampler(0, 0)
+        OGL.glDeleteSamplers(1, [sampler])
+
+
+def _upload_texture(texture, img: npt.NDArray,
+                    shape: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    h, w = img.shape[:2]
+    OGL.glBindTexture(OGL.GL_TEXTURE_2D, texture)
+    # pages of one comics mostly share a size, keep the storage for those
+    if shape != (w, h):
+        OGL.glTexImage2D(OGL.GL_TEXTURE_2D, 0, OGL.GL_RGB8, w, h, 0,
+                         OGL.GL_RGB, OGL.GL_UNSIGNED_BYTE, None)
+    OGL.glTexSubImage2D(OGL.GL_TEXTURE_2D, 0, 0, 0, w, h, OGL.GL_RGB,
+                        OGL.GL_UNSIGNED_BYTE, img)
+    OGL.glGenerateMipmap(OGL.GL_TEXTURE_2D)
+    return w, h
+
+
 @contextmanager
 def tile_models(archive: Archive):
     path = archive.path.with_suffix(".cwt")
@@ -136,7 +173,8 @@ class View:
         library: Library,
         add_action,
         thumb_cache: CoverCache,
-        max_cache: int = 64 * 1024 * 1024
+        max_cache: int = 64 * 1024 * 1024,
+        max_decoded: int = 128 * 1024 * 1024,
     ):
         self._thumb = Thumb(view=self, builder=builder,
                             thumb_cache=thumb_cache, library=library.path)
@@ -154,26 +192,47 @@ class View:
             encoded_size=builder.get_object("encoded_size"),
         )
         self._in_mem = InMemCache(max_cache)
+        self._decoded = InMemCache(max_decoded, sizeof=attrgetter("nbytes"))
+        self._cache_lock = Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2)
+        self._prefetching: Dict[Hashable, Future] = {}
+        # running decodes outlive the pool shutdown, their callbacks not
+        self._closed = False
         self._archive: Optional[Archive] = None
         self._comics: Optional[Comics] = None
         self._page_idx: Optional[int] = None
+        # page the tile overlay belongs to, lags page_idx while decoding
+        self._tiles_idx: Optional[int] = None
         self._img_shape: Optional[npt.NDArray] = None
         self._encoded_size: Optional[int] = None
         self._page_changed = False
+        self._progress_changed = False
+        self._status_idle: Optional[int] = None
+        self._progress_timer: Optional[int] = None
+        self._progress_pending: Optional[Tuple[int, int]] = None
         self._timer = ViewTimer(self)
         self._cursor = Cursor(builder, self)
 
         self._stack = ExitStack()
-        self._tex_stack = self._stack.enter_context(ExitStack())
         self._texture = None
+        self._texture_shape: Optional[Tuple[int, int]] = None
         self._vao = None
         self._vbo = None
+        self._ebo = None
+        self._sampler = None
         self._shader = None
         self._transform = None
+        self._uniform_affine: Optional[npt.NDArray] = None
         self._scale = 1.0
         self._position: npt.NDArray = np.zeros(2)
         self._viewport: Optional[npt.NDArray] = None
         self._affine: Optional[npt.NDArray] = None
+        self._inv_affine: Optional[npt.NDArray] = None
+        # depend on the image shape and the viewport only
+        self._angle: Optional[float] = None
+        self._m_rotation: Optional[npt.NDArray] = None
+        self._keep_aspect: Optional[npt.NDArray] = None
+        self._bounds: Optional[Tuple[npt.NDArray, npt.NDArray]] = None
 
         self._area.set_double_buffered(
             int(os.environ.get("COMICS_VIEWER_DOUBLE_BUFFERED", 1)))
@@ -203,8 +262,14 @@ class View:
         return self
 
     def __exit__(self, *args):
-        if self._page_idx is not None and self._tiles.dirty:
-            self._tile_models[self._page_idx] = self._tiles.tiles
+        if self._status_idle is not None:
+            GLib.source_remove(self._status_idle)
+            self._status_idle = None
+        self.save_progress()
+        if self._tiles_idx is not None and self._tiles.dirty:
+            self._tile_models[self._tiles_idx] = self._tiles.tiles
+        self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
         self._stack.pop_all().close()
 
     @property
@@ -237,8 +302,16 @@ class View:
 
     def _affine_changed(self):
         self._affine = None
+        self._inv_affine = None
         self._tiles.transformation_changed()
 
+    def _shape_changed(self):
+        self._angle = None
+        self._m_rotation = None
+        self._keep_aspect = None
+        self._bounds = None
+        self._affine_changed()
+
     @archive.setter
     def archive(self, path: Path):
         if self._archive and self._archive.path == path:
@@ -251,9 +324,14 @@ class View:
             comics = self.archive.path.name
         self._status.comics.set_label(comics)
         self._window.set_title(comics)
+        if self._tiles_idx is not None and self._tiles.dirty:
+            self._tile_models[self._tiles_idx] = self._tiles.tiles
+        self._tiles_idx = None
         self._tile_stack.pop_all().close()
         self._tile_models = self._tile_stack.enter_context(
             tile_models(self._archive))
+        # the page index refers to the previous archive
+        self._page_idx = None
 
     @property
     def page_idx(self) -> int:
@@ -265,36 +343,32 @@ class View:
 
     @viewport.setter
     def viewport(self, viewport: npt.NDArray):
+        if (
+            self._viewport is not None and
+            np.array_equal(self._viewport, viewport)
+        ):
+            return
         self._viewport = viewport
-        self._affine_changed()
+        self._shape_changed()
 
     @page_idx.setter
     def page_idx(self, page_idx):
         if page_idx >= len(self.archive) or page_idx < 0:
             return
-        if self._page_idx is not None and self._tiles.dirty:
-            self._tile_models[self._page_idx] = self._tiles.tiles
+        if page_idx == self._page_idx:
+            return
         self._page_idx = page_idx
-        self._status.progress.set_label(
-            f"{self.page_number}/{len(self.archive)} "
-            f"({self.fraction * 100:.0f}%)"
-        )
-        self._status.progress_bar.set_fraction(self.fraction)
-        self._status.pagename.set_label(self.archive.name(page_idx))
-        with self._library.new_session as session, session.begin():
-            comics = session.query(Comics).filter_by(
-                id=self._comics.id).one()
-            comics.progress = Progress(
-                page_idx=page_idx,
-                last_read=datetime.now(),
-            )
-            session.add(comics)
+        self._queue_progress()
         self._page_changed = True
+        # queued ahead of the neighbours so it never waits behind them
+        self._prefetch(page_idx)
+        self._prefetch(page_idx + 1)
+        self._prefetch(page_idx - 1)
         self._scale = 1.0
+        self._bounds = None
         self.position = np.zeros(2)
         self._area.queue_render()
         self._thumb.scroll_to(page_idx)
-        self._tiles.tiles = self._tile_models[page_idx]
         self.set_actions(True)
 
     @property
@@ -304,9 +378,8 @@ class View:
     @img_shape.setter
     def img_shape(self, img_shape: Tuple[int, int]):
         self._img_shape = np.array(img_shape)
-        self._affine_changed()
-        self._status.img_shape.set_label(
-            "x".join(map(str, np.flip(self._img_shape))))
+        self._shape_changed()
+        self._queue_status()
 
     @property
     def encoded_size(self) -> Optional[int]:
@@ -315,8 +388,65 @@ class View:
     @encoded_size.setter
     def encoded_size(self, encoded_size: int):
         self._encoded_size = encoded_size
-        self._status.encoded_size.set_label(
-            humanize.naturalsize(encoded_size, gnu=True))
+        self._queue_status()
+
+    def _queue_progress(self):
+        if (
+            self._progress_pending is not None and
+            self._progress_pending[0] != self._comics.id
+        ):
+            self.save_progress()
+        self._progress_pending = (self._comics.id, self.page_idx)
+        # only the page the user settles on is committed
+        if self._progress_timer is not None:
+            GLib.source_remove(self._progress_timer)
+        self._progress_timer = GLib.timeout_add(
+            PROGRESS_SAVE_DELAY_MS, self._progress_timeout)
+
+    def _progress_timeout(self):
+        self._progress_timer = None
+        self.save_progress()
+        return GLib.SOURCE_REMOVE
+
+    def save_progress(self):
+        if self._progress_timer is not None:
+            GLib.source_remove(self._progress_timer)
+            self._progress_timer = None
+        if self._progress_pending is None:
+            return
+        comics_id, page_idx = self._progress_pending
+        self._progress_pending = None
+        with self._library.new_session as session, session.begin():
+            comics = session.query(Comics).filter_by(id=comics_id).one()
+            comics.progress = Progress(
+                page_idx=page_idx,
+                last_read=datetime.now(),
+            )
+            session.add(comics)
+
+    def _queue_status(self):
+        # holding next-page changes the page faster than the labels can
+        # relayout, refresh them once per idle turn
+        if self._status_idle is None:
+            self._status_idle = GLib.idle_add(self._flush_status)
+
+    def _flush_status(self):
+        self._status_idle = None
+        if self._progress_changed:
+            self._progress_changed = False
+            self._status.progress.set_label(
+                f"{self.page_number}/{len(self.archive)} "
+                f"({self.fraction * 100:.0f}%)"
+            )
+            self._status.progress_bar.set_fraction(self.fraction)
+            self._status.pagename.set_label(self.archive.name(self.page_idx))
+        if self._img_shape is not None:
+            self._status.img_shape.set_label(
+                "x".join(map(str, np.flip(self._img_shape))))
+        if self._encoded_size is not None:
+            self._status.encoded_size.set_label(
+                humanize.naturalsize(self._encoded_size, gnu=True))
+        return GLib.SOURCE_REMOVE
 
     @property
     def scale(self) -> float:
@@ -325,6 +455,7 @@ class View:
     @scale.setter
     def scale(self, scale: float):
         self._scale = np.clip(scale, 1.0, 4.0)
+        self._bounds = None
         self._affine_changed()
         self._area.queue_render()
 
@@ -334,41 +465,45 @@ class View:
 
     @position.setter
     def position(self, position: npt.NDArray):
-        if self.img_shape is not None and self.viewport is not None:
-            affine = self.affine(np.zeros(2))
-            vp = np.abs(
-                self.widget_to_img(self.viewport, affine)
-                -
-                self.widget_to_img(np.zeros(2), affine)
-            ) * self.keep_aspect
-            shape = self.img_shape.astype(np.float64)
-            position = np.clip(
-                position,
-                vp / 2 - shape / 2,
-                shape - vp / 2 - shape / 2
-            )
-
+        bounds = self._position_bounds()
+        if bounds is not None:
+            position = np.clip(position, *bounds)
         self._position = position
         self._affine_changed()
         self._area.queue_render()
 
+    def _position_bounds(self) -> Optional[Tuple[npt.NDArray, npt.NDArray]]:
+        if self.img_shape is None or self.viewport is None:
+            return None
+        # independent of the position, thus kept for a whole drag
+        if self._bounds is None:
+            shape = self.img_shape.astype(np.float64)
+            # without translation the widget center maps onto the image
+            # center, the viewport spans twice its corner's distance to it
+            corner = self.widget_to_img(self.viewport,
+                                        self.affine(np.zeros(2)))
+            vp = np.abs(corner - shape / 2) * 2.0 * self.keep_aspect
+            self._bounds = (vp / 2 - shape / 2, shape / 2 - vp / 2)
+        return self._bounds
+
     @property
     def angle(self):
-        if self._affine is None:
-            viewport_aspect = np.divide(*self.viewport)
-            aspects = {
-                abs(np.divide(
-                    *self.img_shape) - viewport_aspect): 0,
-                abs(np.divide(
-                    *np.flip(self.img_shape)) - viewport_aspect): np.pi / 2
-            }
-            self._angle = aspects[min(aspects.keys())]
+        if self._angle is None:
+            (vw, vh), (iw, ih) = self.viewport, self.img_shape
+            viewport_aspect = vw / vh
+            # rotate unless the upright page matches the viewport strictly
+            # better, a tie rotates
+            self._angle = 0 if (
+                abs(iw / ih - viewport_aspect) <
+                abs(ih / iw - viewport_aspect)
+            ) else np.pi / 2
         return self._angle
 
     @property
     def m_rotation(self):
-        angle = self.angle
-        return axangle2mat([0, 0, 1.0], angle)
+        if self._m_rotation is None:
+            self._m_rotation = axangle2mat([0, 0, 1.0], self.angle)
+        return self._m_rotation
 
     @property
     def m_zoom(self):
@@ -389,17 +524,19 @@ class View:
         # invert y
         p *= [1.0, -1.0]
         # rotate by current image rotation
-        p = np.dot(cat(p, 0.0), self.m_rotation)[:2]
+        p = np.dot(p, self.m_rotation[:2, :2])
         return p
 
     @property
     def keep_aspect(self):
         if self.img_shape is None:
             return np.array([1.0, 1.0])
-        vp = np.abs(np.dot(cat(self.viewport, 0), self.m_rotation))[:2]
-        rv = vp / self.img_shape
-        rv /= max(rv)
-        return np.flip(rv)
+        if self._keep_aspect is None:
+            vp = np.abs(np.dot(self.viewport, self.m_rotation[:2, :2]))
+            rv = vp / self.img_shape
+            rv /= max(rv)
+            self._keep_aspect = np.flip(rv)
+        return self._keep_aspect
 
     def widget_to_img(self, pos: npt.NDArray, affine=None):
         return self._transform_position(pos=pos, inverse=True, affine=affine)
@@ -409,29 +546,76 @@ class View:
 
     def _transform_position(self, pos: npt.NDArray,
                             inverse: bool, affine=None) -> npt.NDArray:
-        if affine is None:
-            affine = self.affine()
         if inverse:
-            affine = np.linalg.inv(affine)
+            affine = (
+                self.inv_affine() if affine is None else _invert_affine(affine)
+            )
             src, dst = self.viewport, self.img_shape
         else:
+            affine = self.affine() if affine is None else affine
             src, dst = self.img_shape, self.viewport
-        ndc = np.dot(cat((pos - src / 2.0) / src * 2.0 * [-1.0, 1.0],
-                         0.0, 1.0), affine)[:2]
-        return ((ndc - [-1.0, 1.0]) / 2.0 * [1.0, -1.0] * dst)[:2]
+        # pos is either a single position or an (N, 2) batch of them
+        pos = (pos - src / 2.0) / src * 2.0 * [-1.0, 1.0]
+        # z = 0 and w = 1, only the xy block and the translation row apply
+        ndc = np.dot(pos, affine[:2, :2]) + affine[3, :2]
+        return (ndc - [-1.0, 1.0]) / 2.0 * [1.0, -1.0] * dst
 
     def load(self, base: Path, comics: Comics, page_idx: int) -> bool:
         path = base / comics.path
         try:
             self._comics = comics
             self.archive = path
-            self.page_idx = page_idx
+            if page_idx == self.page_idx:
+                # the setter skips an unchanged page, reopening must still
+                # bump last_read
+                self._queue_progress()
+            else:
+                self.page_idx = page_idx
         except IndexError:
             return False
         except OSError:
             return False
         return True
 
+    def _load_page(self, archive: Archive, page_idx: int) -> npt.NDArray:
+        key = (archive.path, page_idx)
+        with self._cache_lock:
+            image = self._decoded.get(key)
+            if image is not None:
+                return image
+            encoded = self._in_mem.get(key)
+        if encoded is None:
+            encoded = archive.read(page_idx)
+        image = np.asarray(imdecode(encoded))
+        with self._cache_lock:
+            self._in_mem.store(key, encoded)
+            self._decoded.store(key, image)
+        return image
+
+    def _prefetch(self, page_idx: int):
+        self._prefetching = {
+            k: f for k, f in self._prefetching.items() if not f.done()
+        }
+        if page_idx >= len(self.archive) or page_idx < 0:
+            return
+        key = (self.archive.path, page_idx)
+        if key in self._prefetching:
+            return
+        with self._cache_lock:
+            if self._decoded.get(key) is not None:
+                return
+        self._prefetching[key] = self._pool.submit(
+            self._load_page, self.archive, page_idx)
+
+    def _page_loaded(self, key):
+        if self._closed:
+            return GLib.SOURCE_REMOVE
+        if self.archive is not None and key == (self.archive.path,
+                                                self.page_idx):
+            self._page_changed = True
+            self._area.queue_render()
+        return GLib.SOURCE_REMOVE
+
     def _ensure_page(self):
         if not self._page_changed:
             return
@@ -439,16 +623,33 @@ class View:
         if self.archive is None or self.page_idx is None:
             return
         key = (self.archive.path, self.page_idx)
-        encoded = self._in_mem.get(key)
-        if encoded is None:
-            encoded = self.archive.read(self.page_idx)
-            self._in_mem.store(key, encoded)
-        self.encoded_size = len(encoded)
-        image = imdecode(encoded)
-        self._tex_stack.pop_all().close()
+        with self._cache_lock:
+            image = self._decoded.get(key)
+        if image is None:
+            future = self._prefetching.pop(key, None)
+            if future is None:
+                future = self._pool.submit(
+                    self._load_page, self.archive, self.page_idx)
+            if not future.done():
+                # keep showing the previous page until the decode finishes
+                self._prefetching[key] = future
+                future.add_done_callback(
+                    lambda f: GLib.idle_add(self._page_loaded, key))
+                return
+            image = future.result()
+        self.encoded_size = self.archive.size(self.page_idx)
         self._area.make_current()
-        self._texture = self._tex_stack.enter_context(_load_texture(image))
-        self.img_shape = (image.width, image.height)
+        self._texture_shape = _upload_texture(
+            self._texture, image, self._texture_shape)
+        self.img_shape = (image.shape[1], image.shape[0])
+        # the overlay and labels follow the page actually on screen
+        if self._tiles_idx != self.page_idx:
+            if self._tiles_idx is not None and self._tiles.dirty:
+                self._tile_models[self._tiles_idx] = self._tiles.tiles
+            self._tiles_idx = self.page_idx
+            self._tiles.tiles = self._tile_models[self.page_idx]
+            self._progress_changed = True
+            self._queue_status()
         self._area.queue_render()
 
     def _render(self, area: Gtk.GLArea, context: Gdk.GLContext):
@@ -457,25 +658,28 @@ class View:
         OGL.glClear(OGL.GL_COLOR_BUFFER_BIT)
         x, y, w, h = OGL.glGetIntegeri_v(OGL.GL_VIEWPORT, 0)
         self.viewport = np.array([w, h])
-        if self._texture is not None:
+        if self._texture_shape is not None:
             with self._shader:
-                OGL.glUniformMatrix4fv(self._transform,
-                                       1, OGL.GL_FALSE,
-                                       self.affine())
+                # uniforms persist in the program, upload only on change
+                affine = self.affine()
+                if affine is not self._uniform_affine:
+                    OGL.glUniformMatrix4fv(self._transform,
+                                           1, OGL.GL_FALSE, affine)
+                    self._uniform_affine = affine
                 OGL.glBindTexture(OGL.GL_TEXTURE_2D, self._texture)
                 OGL.glBindVertexArray(self._vao)
                 OGL.glDrawElements(
-                    OGL.GL_TRIANGLES, 6, OGL.GL_UNSIGNED_INT, INDICES_DATA)
-        OGL.glFlush()
+                    OGL.GL_TRIANGLES, 6, OGL.GL_UNSIGNED_INT, c_void_p(0))
         return True
 
     def affine(self, translate: Optional[npt.NDArray] = None):
         def compose():
-            return affine_compose(
-                Z=cat(self.m_zoom, 1),
-                T=cat(translate, 0),
-                R=self.m_rotation
-            ).T.astype(np.float64)
+            # transposed T * R * Z, written in place of the 4x4 identity,
+            # the rotation is about z thus z itself stays as is
+            rv = np.eye(4)
+            rv[:2, :2] = (self.m_rotation[:2, :2] * self.m_zoom).T
+            rv[3, :2] = translate
+            return rv
         if translate is not None:
             return compose()
         if self._affine is None:
@@ -483,6 +687,11 @@ class View:
             self._affine = compose()
         return self._affine
 
+    def inv_affine(self):
+        if self._inv_affine is None:
+            self._inv_affine = _invert_affine(self.affine())
+        return self._inv_affine
+
     def _realize(self, area: Gtk.GLArea, ctx: Gdk.GLContext):
         area.make_current()
         OGL.glPixelStorei(OGL.GL_UNPACK_ALIGNMENT, 1)
@@ -492,22 +701,27 @@ class View:
             OGL.glVertexAttribPointer(0, 3,
                                       OGL.GL_FLOAT,
                                       OGL.GL_FALSE,
-                                      len(VERTEX_DATA),
+                                      VERTEX_STRIDE,
                                       None)
             OGL.glEnableVertexAttribArray(0)
             OGL.glVertexAttribPointer(1, 2,
                                       OGL.GL_FLOAT,
                                       OGL.GL_FALSE,
-                                      len(VERTEX_DATA),
-                                      c_void_p(3 * 4))
+                                      VERTEX_STRIDE,
+                                      c_void_p(3 * VERTEX_DATA.itemsize))
             OGL.glEnableVertexAttribArray(1)
-        with (RESOURCE_BASE_DIR / "view.fs").open() as f:
-            fragment_code = f.read()
-        with (RESOURCE_BASE_DIR / "view.vs").open() as f:
-            vertex_code = f.read()
+        self._ebo = self._stack.enter_context(
+            _vbo(INDICES_DATA, OGL.GL_ELEMENT_ARRAY_BUFFER))
+        # left bound, the VAO records the element buffer with its state
+        self._ebo.bind()
         self._shader = self._stack.enter_context(
-            _compile_and_link_shaders(fragment_code, vertex_code))
+            _compile_and_link_shaders(FRAGMENT_CODE, VERTEX_CODE))
         self._transform = OGL.glGetUniformLocation(self._shader, "transform")
+        self._uniform_affine = None
+        self._texture = self._stack.enter_context(_texture())
+        self._texture_shape = None
+        self._sampler = self._stack.enter_context(_sampler())
+        self._page_changed = True
         self._ensure_page()
 
     def _unrealize(self, area: Gtk.GLArea, ctx: Gdk.GLContext):
@@ -544,4 +758,4 @@ class View:
             m_rotation = self.m_rotation
         else:
             m_rotation = axangle2mat([0, 0, 1.0], angle)
-        return np.dot(cat(p, 0), m_rotation)[:2]
+        return np.dot(p, m_rotation[:2, :2])
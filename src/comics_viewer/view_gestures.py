@@ -1,11 +1,12 @@
-from typing import Optional
+from typing import Optional, Tuple
+import os
 import numpy as np
 from collections import namedtuple
 import numpy.typing as npt
 from enum import Enum
 
 from .utils import is_in
-from .gi_helpers import Gtk, Gdk
+from .gi_helpers import Gtk, Gdk, GLib
 from .cursor import Cursor, CursorIcon
 
 # ERASER 1 and PEN 1 works on touching the display
@@ -15,35 +16,37 @@ from .cursor import Cursor, CursorIcon
 
 DragData = namedtuple("DragData", [
     "start_pos",
-    "affine",
-    "start_widget",
-    "start_img",
+    # image offset of a unit widget offset along x and y
+    "dx_img",
+    "dy_img",
 ])
 
 
-def event_source_type() -> Optional[Gdk.InputSource]:
-    event = Gtk.get_current_event()
+# the handlers get the event already, Gtk.get_current_event() would hand
+# back a copy of it on every motion
+def event_source_type(event: Gdk.Event) -> Optional[Gdk.InputSource]:
     source_device = event.get_source_device()
     if source_device is None:
         return None
     return source_device.get_source()
 
 
+KEEP_CURSOR_SOURCES = frozenset([
+    Gdk.InputSource.PEN, Gdk.InputSource.ERASER, Gdk.InputSource.TOUCHSCREEN,
+])
+EDIT_SOURCES = frozenset([Gdk.InputSource.PEN, Gdk.InputSource.ERASER])
+
+
 def dec_event_handler(func):
-    def wrapper(self, *args, _func=func, **kwargs):
-        source = event_source_type()
-        if source is None or source not in [
-            Gdk.InputSource.PEN, Gdk.InputSource.ERASER,
-            Gdk.InputSource.TOUCHSCREEN,
-        ]:
+    def wrapper(self, event_box, event, _func=func):
+        source = event_source_type(event)
+        if source not in KEEP_CURSOR_SOURCES:
             self._view.timer.cursor()
-        filter_in = [Gdk.InputSource.PEN, Gdk.InputSource.ERASER]
-        if self.edit_with_mouse:
-            filter_in.append(Gdk.InputSource.MOUSE)
-
-        if source is None or source not in filter_in:
-            return False
-        return _func(self, *args, **kwargs)
+        if source in EDIT_SOURCES or (
+            self.edit_with_mouse and source == Gdk.InputSource.MOUSE
+        ):
+            return _func(self, event_box, event)
+        return False
     return wrapper
 
 
@@ -54,8 +57,11 @@ class Direction(Enum):
     right = 0
 
 
+# checked at the call sites, gesture callbacks fire per motion event
+DEBUG_GESTURES = bool(int(os.environ.get("COMICS_VIEWER_DEBUG_GESTURES", 0)))
+
+
 def gesture_msg(*args, **kwargs):
-    return
     print(*args, **kwargs)
 
 
@@ -77,6 +83,8 @@ class ViewGestures:
         self._drag.connect("drag-end", self.drag_end)
         self._drag.connect("drag-update", self.drag_update)
         self._drag_data: Optional[DragData] = None
+        self._drag_offset: Optional[Tuple[float, float]] = None
+        self._drag_idle: Optional[int] = None
 
         self._swipe = Gtk.GestureSwipe.new(event_box)
         self._swipe.connect("swipe", self.swipe)
@@ -88,9 +96,6 @@ class ViewGestures:
 
         self._edit_with_mouse = False
 
-        def disable_timer(*x):
-            self._view.timer.enabled = False
-            self._view.cursor.set_cursor(CursorIcon.DEFAULT)
         event_box.connect(
             "leave-notify-event",
             lambda *x: self._view.cursor.set_cursor(CursorIcon.DEFAULT)
@@ -110,48 +115,71 @@ class ViewGestures:
 
     def zoom_begin(self, gesture: Gtk.GestureZoom,
                    sequence: Optional[Gdk.EventSequence]):
-        gesture_msg("zoom begin")
+        if DEBUG_GESTURES:
+            gesture_msg("zoom begin")
         self._scale_at_begin = self._view.scale
         self._position_at_begin = self._view.position
 
     def zoom_end(self, gesture: Gtk.GestureZoom,
                  sequence: Optional[Gdk.EventSequence]):
-        gesture_msg("zoom end")
+        if DEBUG_GESTURES:
+            gesture_msg("zoom end")
         self._scale_at_begin = None
         self._position_at_begin = None
 
     def zoom_scale_changed(self, gesture: Gtk.GestureZoom,
                            sequence: Optional[Gdk.EventSequence]):
-        gesture_msg("zoom scale changed")
+        if DEBUG_GESTURES:
+            gesture_msg("zoom scale changed")
         self._view.scale = self._scale_at_begin * gesture.get_scale_delta()
         self._view.position = self._position_at_begin
 
     def drag_begin(self, gesture: Gtk.GestureDrag,
                    start_x: float, start_y: float):
-        gesture_msg("drag begin")
-        start = np.array([start_x, start_y])
+        if DEBUG_GESTURES:
+            gesture_msg("drag begin")
+        # the transform is affine, precompute its linear part so an update
+        # is two multiply-adds instead of a full widget_to_img
+        start, dx, dy = self._view.widget_to_img(np.array([
+            [start_x, start_y], [start_x + 1.0, start_y],
+            [start_x, start_y + 1.0],
+        ]))
         self._drag_data = DragData(
             start_pos=self._view.position,
-            affine=self._view.affine(),
-            start_widget=start,
-            start_img=self._view.widget_to_img(start, self._view.affine()),
+            dx_img=dx - start,
+            dy_img=dy - start,
         )
 
     def drag_update(self, gesture: Gtk.GestureDrag,
                     offset_x: float, offset_y: float):
-        gesture_msg("drag update")
-        offset = np.array([offset_x, offset_y])
+        if DEBUG_GESTURES:
+            gesture_msg("drag update")
+        # the offset is relative to the drag start, only the last one
+        # before a redraw matters
+        self._drag_offset = (offset_x, offset_y)
+        if self._drag_idle is None:
+            self._drag_idle = GLib.idle_add(self._drag_flush,
+                                            priority=GLib.PRIORITY_HIGH_IDLE)
+
+    def _drag_flush(self):
+        self._drag_idle = None
+        offset_x, offset_y = self._drag_offset
         self._view.position = self._drag_data.start_pos - (
-            self._view.widget_to_img(
-                self._drag_data.start_widget + offset,
-                self._drag_data.affine) - self._drag_data.start_img
+            offset_x * self._drag_data.dx_img +
+            offset_y * self._drag_data.dy_img
         )
+        return GLib.SOURCE_REMOVE
 
     def drag_end(self, gesture: Gtk.GestureDrag,
                  offset_x: float, offset_y: float):
-        gesture_msg("drag end", offset_x, offset_y)
+        if DEBUG_GESTURES:
+            gesture_msg("drag end", offset_x, offset_y)
+        if self._drag_idle is not None:
+            GLib.source_remove(self._drag_idle)
+            self._drag_flush()
         self._drag_data = None
-        if not np.isclose(np.linalg.norm(np.array([offset_x, offset_y])), 0):
+        # same tolerance as np.isclose(norm, 0), compared squared
+        if offset_x * offset_x + offset_y * offset_y > 1e-16:
             return
         _, start_x, start_y = gesture.get_start_point()
         x = self._view.rotate(np.array([start_x, start_y]))[0]
@@ -164,11 +192,12 @@ class ViewGestures:
 
     def swipe(self, gesture: Gtk.GestureSwipe,
               velocity_x: float, velocity_y: float):
-        gesture_msg("swipe")
+        if DEBUG_GESTURES:
+            gesture_msg("swipe")
         if not np.isclose(self._view.scale, 1):
             return
         velocity = self._view.rotate(np.array([velocity_y, velocity_x]))
-        if np.linalg.norm(velocity) < 100:
+        if np.hypot(*velocity) < 100:
             return
         angle = np.arctan2(*velocity)
         directions = list(Direction.__members__.items())
@@ -215,7 +244,7 @@ class ViewGestures:
         pos = is_in(event_box, event.x, event.y)
         if pos is None:
             return False
-        source = event_source_type()
+        source = event_source_type(event)
         if source == Gdk.InputSource.PEN:
             if event.button == 1:
                 self.tiles.pen_down(pos)
@@ -234,7 +263,7 @@ class ViewGestures:
         pos = is_in(event_box, event.x, event.y)
         if pos is None:
             return False
-        source = event_source_type()
+        source = event_source_type(event)
         if source == Gdk.InputSource.PEN:
             if event.button == 1:
                 self.tiles.pen_up(pos)
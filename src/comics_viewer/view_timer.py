@@ -1,6 +1,48 @@
 from .gi_helpers import GLib
 from .cursor import CursorIcon
-from time import time
+from time import monotonic_ns
+from typing import Optional, Callable
+
+
+# calls back once timeout seconds after the last touch, touching only
+# stores a timestamp, the single pending source checks it when it fires and
+# sleeps for the remainder if the deadline moved in the meantime, whole
+# seconds suffice thus GLib may align the wakeups with other sources
+class Deadline:
+    def __init__(self, timeout: float, callback: Callable[[], None]):
+        # monotonic, a wall clock jump must not fire or stall the deadline
+        self._timeout_ns = int(timeout * 1e9)
+        self._callback = callback
+        self._stamp = monotonic_ns()
+        self._source_id: Optional[int] = None
+
+    def touch(self):
+        self._stamp = monotonic_ns()
+        if self._source_id is None:
+            self._schedule(self._timeout_ns)
+
+    def arm(self):
+        # make sure the callback comes once due, the stamp stays as is
+        if self._source_id is None:
+            self._schedule(self._stamp + self._timeout_ns - monotonic_ns())
+
+    def cancel(self):
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+    def _schedule(self, delay_ns: int):
+        seconds = max(1, -(-delay_ns // 1000000000))
+        self._source_id = GLib.timeout_add_seconds(seconds, self._on_timeout)
+
+    def _on_timeout(self):
+        remaining = self._stamp + self._timeout_ns - monotonic_ns()
+        if remaining > 0:
+            self._schedule(remaining)
+        else:
+            self._source_id = None
+            self._callback()
+        return GLib.SOURCE_REMOVE
 
 
 class ViewTimer:
@@ -9,12 +51,13 @@ class ViewTimer:
                  tile_timeout: float = 5,
                  cursor_timeout: float = 3):
         self._view = view
-        self._tile_timeout = tile_timeout
-        self._cursor_timeout = cursor_timeout
-
         self._enabled = False
-        self._tile = time()
-        self._cursor = time()
+        # tiles and cursor are created after the timer
+        self._tile = Deadline(tile_timeout,
+                              lambda: self._view.tiles.hide_tiles())
+        self._cursor = Deadline(
+            cursor_timeout,
+            lambda: self._view.cursor.set_cursor(CursorIcon.NONE))
 
     @property
     def enabled(self) -> bool:
@@ -23,25 +66,21 @@ class ViewTimer:
     @enabled.setter
     def enabled(self, enabled):
         if not self._enabled and enabled:
-            self._tile = time()
-            self._cursor = time()
-            GLib.timeout_add(1000, self.on_timeout)
+            self._tile.touch()
+            self._cursor.touch()
+        elif self._enabled and not enabled:
+            self._tile.cancel()
+            self._cursor.cancel()
         self._enabled = enabled
 
     def tile(self, icon: CursorIcon):
         self._view.cursor.set_cursor(icon)
-        self._tile = time()
+        if self._enabled:
+            self._tile.touch()
+            # the icon is shown without a motion event, hide it again
+            self._cursor.arm()
 
     def cursor(self):
         self._view.cursor.set_cursor(CursorIcon.DEFAULT)
-        self._cursor = time()
-
-    def on_timeout(self):
-        if not self._enabled:
-            return
-        now = time()
-        if abs(now - self._cursor) > self._cursor_timeout:
-            self._view.cursor.set_cursor(CursorIcon.NONE)
-        if abs(now - self._tile) > self._tile_timeout:
-            self._view.tiles.hide_tiles()
-        GLib.timeout_add(1000, self.on_timeout)
+        if self._enabled:
+            self._cursor.touch()